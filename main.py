@@ -4,6 +4,7 @@
 а также оптимальные и "хитрые" ходы.
 В конце файла есть пример использования класссов.
 """
+import threading
 
 
 class Position:
@@ -24,12 +25,37 @@ class Position:
         self.catching_the_transmission = -1  # "хитрый" ход: номер  максимальной карты, которую противник должен побить, а принять - ошибка, или -1 если не задано
         self.opponents_moves = {}  # оптимальный ответный ход ходящего вторым игрока для любого варианта хода текущего игрока
 
+    def scaled(self, weight):
+        """
+        Позиция игры, в которой у всех карт одинаковый положительный целый вес weight. Ходы и победитель в ней такие
+        же, отличается только счет.
+        :param weight: вес каждой карты
+        :return: новая позиция со счетом, умноженным на weight
+        """
+        p = Position(self.who_wins, self.winning_score * weight)
+        p.good_moves = self.good_moves
+        p.catching_the_take = self.catching_the_take
+        p.catching_the_transmission = self.catching_the_transmission
+        p.opponents_moves = self.opponents_moves
+        return p
+
 
 class OdnomastkaDurak:
     """
     Класс, решающий игру Одноматска Дурак
     """
 
+    # уже просчитанные позиции. Позиция зависит только от распределения карт, поэтому таблица общая для всех
+    # экземпляров (в том числе для Д-Дурака и для игр с одинаковыми весами), и повторные запросы не решают игру заново.
+    # Таблица живет, пока работает программа: одна позиция занимает около 0.7 КБ, так что при max_moves_tree_size
+    # позиций таблица занимает около 140 МБ (у игр с весами своя таблица такого же размера). Размер проверяется только
+    # перед решением новой позиции, и тогда таблица очищается целиком, поэтому одно большое решение может его превысить.
+    moves_tree = {}
+    max_moves_tree_size = 2 * 10 ** 5
+    # Таблицы общие, поэтому решение и чтение позиций идут под этой блокировкой. Один экземпляр игры при этом
+    # нельзя использовать из нескольких потоков одновременно: ходы меняют его состояние.
+    lock = threading.RLock()
+
     def __init__(self, cards, player):
         """
         Конструктор класса
@@ -37,7 +63,6 @@ class OdnomastkaDurak:
         i-ая карта принадлежит игроку k)
         :param player: игрок, который начинает игру
         """
-        self.moves_tree = {}  # уже просчитанные позиции
         self.pole = -1  # карта лежащая на столе
         self.cards = 0  # текущие карты в формате числа. То есть если i-ый бит в двоичном счислении равен k, то i-ая карта принадлежит игроку k
         self.max_size = len(cards)  # максимальное количество карт
@@ -52,41 +77,65 @@ class OdnomastkaDurak:
         self.cards += self.degrees[self.size]  # обозначает общее число карт
         if player == 1:
             self.change_player()  # теперь считаем, что первый ходит игрок 0
-        self.build_moves_tree()
+        self.get_position()
+
+    def get_position(self):
+        """
+        :return: просчитанная позиция для текущего распределения карт. Если ее еще нет в таблице, она досчитывается.
+        """
+        with self.lock:
+            if self.moves_tree.get(self.cards) is None:
+                if len(self.moves_tree) > self.max_moves_tree_size:
+                    self.moves_tree.clear()
+                # если решение прервется исключением, возвращаем игру в текущее состояние
+                state = (self.cards, self.size, self.reverse, self.pole)
+                try:
+                    self.build_moves_tree()
+                finally:
+                    self.cards, self.size, self.reverse, self.pole = state
+            return self.moves_tree[self.cards]
+
+    @classmethod
+    def clear_moves_tree(cls):
+        """
+        Очищает общую таблицу просчитанных позиций. Уже созданные игры досчитают нужные позиции заново.
+        """
+        with cls.lock:
+            cls.moves_tree.clear()
 
     def who_wins(self):
         """
         :return: номер выигрывающего игрока
         """
-        return (self.moves_tree[self.cards].who_wins + self.reverse) % 2
+        return (self.get_position().who_wins + self.reverse) % 2
 
     def winning_score(self):
         """
         :return: с каким счетом выиграет победивший игрок, то есть сколько у его противника останется карт
         """
-        return self.moves_tree[self.cards].winning_score
+        return self.get_position().winning_score
 
     def good_moves(self):
         """
         :return: оптимальные ходы от текущей позиции. Индексы считаются с 1.
         """
-        return [x + 1 for x in self.moves_tree[self.cards].good_moves]
+        return [x + 1 for x in self.get_position().good_moves]
 
     def catching_the_transmission(self):
         """
         :return: ловля пропускание от текущей позиции (None если не определено). Индекс считается с 1.
         """
-        if self.moves_tree[self.cards].catching_the_transmission == -1:
+        if self.get_position().catching_the_transmission == -1:
             return None
-        return self.moves_tree[self.cards].catching_the_transmission + 1
+        return self.get_position().catching_the_transmission + 1
 
     def catching_the_take(self):
         """
         :return: ловля взятие от текущей позиции (None если не определено). Индекс считается с 1.
         """
-        if self.moves_tree[self.cards].catching_the_take == -1:
+        if self.get_position().catching_the_take == -1:
             return None
-        return self.moves_tree[self.cards].catching_the_take + 1
+        return self.get_position().catching_the_take + 1
 
     def has_player_position(self, pos, player):
         """
@@ -159,22 +208,22 @@ class OdnomastkaDurak:
         """
         if self.is_end():  # окончена ли игра
             return -1
+        now = self.get_position()
         if self.pole == -1:  # если на столе нет карты
             self.now_player = (self.now_player + 1) % 2
-            if self.moves_tree[self.cards].catching_the_take != -1:  # проверяем определена ли ловля взятие
-                self.pole = self.moves_tree[self.cards].catching_the_take
-                return self.names_of_cards[self.moves_tree[self.cards].catching_the_take]
-            elif self.moves_tree[
-                self.cards].catching_the_transmission != -1:  # проверяем определена ли ловля пропускание
-                self.pole = self.moves_tree[self.cards].catching_the_transmission
-                return self.names_of_cards[self.moves_tree[self.cards].catching_the_transmission]
+            if now.catching_the_take != -1:  # проверяем определена ли ловля взятие
+                self.pole = now.catching_the_take
+                return self.names_of_cards[now.catching_the_take]
+            elif now.catching_the_transmission != -1:  # проверяем определена ли ловля пропускание
+                self.pole = now.catching_the_transmission
+                return self.names_of_cards[now.catching_the_transmission]
             else:  # если хитрых ходов нет, то просто берем какой-то оптимальный ход
-                self.pole = self.moves_tree[self.cards].good_moves[0]
-                return self.names_of_cards[self.moves_tree[self.cards].good_moves[0]]
+                self.pole = now.good_moves[0]
+                return self.names_of_cards[now.good_moves[0]]
         else:  # на столе есть карта
             t = self.pole
             self.pole = -1  # очищаем карту со стола
-            res = self.moves_tree[self.cards].opponents_moves[t]  # оптимальный ход для этой карты на столе и позиции
+            res = now.opponents_moves[t]  # оптимальный ход для этой карты на столе и позиции
             if res == t:  # Если оптимальный ход - принять карту
                 self.now_player = (self.now_player + 1) % 2
                 self.change_position(res)
@@ -230,6 +279,23 @@ class OdnomastkaDurak:
                 self.change_player()
         return 0
 
+    def set_owner(self, card, player):
+        """
+        Отдает карту card игроку player и досчитывает новую позицию. Позиции в таблице определяются оставшимися
+        картами, поэтому пересчитываются только позиции, в которых еще есть измененная карта, а остальные берутся из
+        уже решенной игры.
+        :param card: номер карты
+        :param player: номер игрока
+        :return: 0, если все верно, -1 при ошибке
+        """
+        if self.pole != -1 or player not in (0, 1) or card not in self.names_of_cards:  # на столе не должно быть карты
+            return -1
+        pos = self.names_of_cards.index(card)
+        if not self.has_player_position(pos, (player + self.reverse) % 2):
+            self.change_position(pos)
+        self.get_position()
+        return 0
+
     def write_position(self, p, pole, is_catching):
         """
         Записывает в self.moves_tree[self.cards] позицию p
@@ -338,12 +404,17 @@ class OdnomastkaDurak:
         if self.cards == (self.degrees[self.size + 1] - 1):  # все карты у игрока 1
             self.moves_tree[self.cards] = Position(0, self.size)
             return
-        self.moves_tree[self.cards] = Position()
+        now = self.cards
+        self.moves_tree[now] = Position()
         # пробуем положить на стол все карты, принадлежащие игроку 0 и проверяем, какая даст лучший результат
-        for i in range(self.size):
-            if self.has_player_position(i, 0):
-                self.pole = i
-                self.build_moves_tree_opponent()
+        try:
+            for i in range(self.size):
+                if self.has_player_position(i, 0):
+                    self.pole = i
+                    self.build_moves_tree_opponent()
+        except BaseException:
+            del self.moves_tree[now]  # недосчитанная позиция не должна остаться в общей таблице
+            raise
         self.pole = -1
 
     def print(self):
@@ -394,7 +465,7 @@ class OdnomastkaD_Durak(OdnomastkaDurak):
         """
         if self.winning_score() == 0:  # у обоих игроков в конце кончились карты
             return 2
-        return (self.moves_tree[self.cards].who_wins + self.reverse) % 2
+        return (self.get_position().who_wins + self.reverse) % 2
 
 
 class OdnomastkaDurakWithWeights(OdnomastkaDurak):
@@ -403,6 +474,8 @@ class OdnomastkaDurakWithWeights(OdnomastkaDurak):
     но сумма весов карт противника отрицательная, то он проиграл.
     """
 
+    moves_tree = {}  # уже просчитанные позиции с весами, общие для всех экземпляров (см. OdnomastkaDurak.moves_tree)
+
     def __init__(self, cards, player, weights):
         """
         Конструктор класса
@@ -411,7 +484,6 @@ class OdnomastkaDurakWithWeights(OdnomastkaDurak):
         :param player: игрок, который начинает игру
         :param weights: массив весов карт
         """
-        self.moves_tree = {}  # уже просчитанные позиции
         self.pole = -1  # карта лежащая на столе
         self.cards = 0  # текущие карты в формате числа. То есть если i-ый бит в двоичном счислении равен k, то i-ая карта принадлежит игроку k
         self.max_size = len(cards)  # максимальное количество карт
@@ -427,41 +499,107 @@ class OdnomastkaDurakWithWeights(OdnomastkaDurak):
         self.cards += self.degrees[self.size]  # обозначает общее число карт
         if player == 1:
             self.change_player()  # теперь считаем, что первый ходит игрок 0
-        self.build_moves_tree()
-
-    def who_wins(self):
-        """
-        :return: номер выигрывающего игрока
-        """
-        return (self.moves_tree[(self.cards, self.weights)].who_wins + self.reverse) % 2
+        self.weight = None  # общий вес всех карт или None, если веса разные
+        self.core = None  # игра без весов, через которую решается игра с одинаковыми весами
+        self.check_weights()
+        self.get_position()
 
-    def winning_score(self):
+    def check_weights(self):
         """
-        :return: с каким счетом выиграет победивший игрок, то есть сколько у его противника останется карт с учетом весов
+        Если у всех карт одинаковый положительный вес, то это та же игра без весов, только счет умножен на вес.
+        Тогда позиции берутся из общей таблицы OdnomastkaDurak, а не решаются заново с ключами-кортежами. Только для
+        целых весов: у дробных весов сумма и произведение на количество карт могут отличаться из-за округления.
         """
-        return self.moves_tree[(self.cards, self.weights)].winning_score
+        if len(set(self.weights)) == 1 and self.weights[0] > 0 and all(isinstance(w, int) for w in self.weights):
+            self.weight = self.weights[0]
+            if self.core is None:
+                self.core = OdnomastkaDurak([0] * self.size, 0)
+        else:
+            self.weight = None
+            self.core = None
 
-    def good_moves(self):
-        """
-        :return: оптимальные ходы от текущей позиции. Индексы считаются с 1.
+    def get_position(self):
         """
-        return [x + 1 for x in self.moves_tree[(self.cards, self.weights)].good_moves]
-
-    def catching_the_transmission(self):
+        :return: просчитанная позиция для текущего распределения карт и весов. Если ее еще нет в таблице, она
+        досчитывается.
         """
-        :return: ловля пропускание от текущей позиции (None если не определено) Индекс считается с 1.
+        if self.core is not None:
+            self.core.cards = self.cards
+            self.core.size = self.size
+            p = self.core.get_position()
+            if self.weight == 1:
+                return p
+            return p.scaled(self.weight)
+        now = (self.cards, self.weights)
+        with self.lock:
+            if self.moves_tree.get(now) is None:
+                if len(self.moves_tree) > self.max_moves_tree_size:
+                    self.moves_tree.clear()
+                # если решение прервется исключением, возвращаем игру в текущее состояние
+                state = (self.cards, self.size, self.reverse, self.pole, self.weights)
+                try:
+                    self.build_moves_tree()
+                finally:
+                    self.cards, self.size, self.reverse, self.pole, self.weights = state
+            return self.moves_tree[now]
+
+    def set_weight(self, card, weight):
+        """
+        Меняет вес карты card и досчитывает новую позицию. Из таблицы берутся позиции, в которых этой карты уже
+        нет: они от ее веса не зависят. Позиции, в которых карта еще есть, решаются заново, потому что от ее веса
+        зависит их счет, так что правка веса карты, которая долго остается в игре, занимает почти столько же, сколько
+        решение новой игры. Позиции со старым весом карты, достижимые из текущей, удаляются из таблицы, чтобы она не
+        росла от правок.
+        :param card: номер карты
+        :param weight: новый вес карты
+        :return: 0, если все верно, -1 при ошибке
         """
-        if self.moves_tree[(self.cards, self.weights)].catching_the_transmission == -1:
-            return None
-        return self.moves_tree[(self.cards, self.weights)].catching_the_transmission + 1
+        if self.pole != -1 or card not in self.names_of_cards:  # на столе не должно быть карты
+            return -1
+        pos = self.names_of_cards.index(card)
+        with self.lock:
+            if self.core is None:  # позиции игры без весов не зависят от раздачи, их оставляем
+                visited = set()
+                state = (self.cards, self.size, self.reverse, self.weights)
+                try:
+                    self.find_card_positions(pos, visited)
+                finally:
+                    self.cards, self.size, self.reverse, self.weights = state
+                for now in {key for key, _ in visited}:
+                    self.moves_tree.pop(now, None)
+            self.weights = self.weights[:pos] + (weight,) + self.weights[pos + 1:]
+            self.check_weights()
+            self.get_position()
+        return 0
 
-    def catching_the_take(self):
+    def find_card_positions(self, pos, visited):
         """
-        :return: ловля взятие от текущей позиции (None если не определено). Индекс считается с 1.
+        Находит посчитанные позиции, достижимые из текущей, в которых еще есть карта pos. Ходы от позиции не
+        зависят от весов, поэтому после смены веса карты эти позиции больше не достижимы.
+        :param pos: позиция карты
+        :param visited: множество пар (ключ позиции в таблице, позиция карты), куда добавляются найденные позиции
         """
-        if self.moves_tree[(self.cards, self.weights)].catching_the_take == -1:
-            return None
-        return self.moves_tree[(self.cards, self.weights)].catching_the_take + 1
+        now = (self.cards, self.weights)
+        if (now, pos) in visited or now not in self.moves_tree:
+            return
+        visited.add((now, pos))
+        if self.is_end():
+            return
+        for i in range(self.size):
+            if self.has_player_position(i, 0):
+                # игрок 1 принимает карту i
+                self.change_position(i)
+                self.find_card_positions(pos, visited)
+                self.change_position(i)
+                # игрок 1 бьет карту i картой protection, если это не карта pos
+                for protection in range(i + 1, self.size):
+                    if self.has_player_position(protection, 1) and pos != i and pos != protection:
+                        w1, w2 = self.weights[i], self.weights[protection]
+                        self.remove(i, protection)
+                        self.change_player()
+                        self.find_card_positions(pos - (i < pos) - (protection < pos), visited)
+                        self.change_player()
+                        self.add(i, 0, w1, protection, 1, w2)
 
     def remove(self, pos1, pos2):
         """
@@ -499,44 +637,6 @@ class OdnomastkaDurakWithWeights(OdnomastkaDurak):
         self.weights = self.weights[:pos2] + (weight2,) + self.weights[pos2:]
         self.size += 2
 
-    def move_by_computer(self):
-        """
-        Сделать ход компьютером
-        :return: -1, если игра окончена, иначе номер карты - если компьютер решил принят карты.ю лежашую на чтоле, то
-        он вернет ее номер, иначе это номер карты, которую от кладет на стол.
-        """
-        if self.is_end():  # окончена ли игра
-            return -1
-        now = (self.cards, self.weights)
-        if self.pole == -1:  # если на столе нет карты
-            self.now_player = (self.now_player + 1) % 2
-            if self.moves_tree[now].catching_the_take != -1:  # проверяем определена ли ловля взятие
-                self.pole = self.moves_tree[now].catching_the_take
-                return self.names_of_cards[self.moves_tree[now].catching_the_take]
-            elif self.moves_tree[now].catching_the_transmission != -1:  # проверяем определена ли ловля пропускание
-                self.pole = self.moves_tree[now].catching_the_transmission
-                return self.names_of_cards[self.moves_tree[now].catching_the_transmission]
-            else:  # если хитрых ходов нет, то просто берем какой-то оптимальный ход
-                self.pole = self.moves_tree[now].good_moves[0]
-                return self.names_of_cards[self.moves_tree[now].good_moves[0]]
-        else:  # на столе есть карта
-            t = self.pole
-            self.pole = -1  # очищаем карту со стола
-            res = self.moves_tree[now].opponents_moves[t]  # оптимальный ход для этой карты на столе и позиции
-            if res == t:  # Если оптимальный ход - принять карту
-                self.now_player = (self.now_player + 1) % 2
-                self.change_position(res)
-                return self.names_of_cards[res]
-            # если оптимально - побить карту
-            self.remove(res, t)
-            res = self.names_of_cards[res]
-            # Удаляем использованные карты из self.names_of_cards, чтобы потом выдавать верные названия карт
-            self.names_of_cards.remove(res)
-            self.names_of_cards.remove(self.names_of_cards[t])
-            # Мы только здесь вызываем эту функцию, так как только здесь возникает ситуации, где на столе нет карты, а ходить игроку 1
-            self.change_player()
-            return res
-
     def write_position(self, p, pole, is_catching):
         """
         Записывает в self.moves_tree[self.cards] позицию p
@@ -654,10 +754,14 @@ class OdnomastkaDurakWithWeights(OdnomastkaDurak):
             return
         # пробуем положить на стол все карты, принадлежащие игроку 0 и проверяем, какая даст лучший результат
         self.moves_tree[now] = Position()
-        for i in range(self.size):
-            if self.has_player_position(i, 0):
-                self.pole = i
-                self.build_moves_tree_opponent()
+        try:
+            for i in range(self.size):
+                if self.has_player_position(i, 0):
+                    self.pole = i
+                    self.build_moves_tree_opponent()
+        except BaseException:
+            del self.moves_tree[now]  # недосчитанная позиция не должна остаться в общей таблице
+            raise
         self.pole = -1
 
 
@@ -673,7 +777,7 @@ class OdnomastkaD_DurakWithWeights(OdnomastkaDurakWithWeights):
         """
         if self.winning_score() == 0:  # итоговый счет = 0
             return 2
-        return (self.moves_tree[(self.cards, self.weights)].who_wins + self.reverse) % 2
+        return (self.get_position().who_wins + self.reverse) % 2
 
 
 def example():
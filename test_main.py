@@ -0,0 +1,188 @@
+"""
+Проверки решателя из main.py. Запуск: python -m unittest test_main
+"""
+import itertools
+import random
+import threading
+import unittest
+
+from main import OdnomastkaDurak, OdnomastkaD_Durak, OdnomastkaDurakWithWeights, OdnomastkaD_DurakWithWeights
+
+
+def answers(game):
+    """
+    :return: все ответы игры от текущей позиции
+    """
+    return [game.who_wins(), game.winning_score(), game.good_moves(), game.catching_the_take(),
+            game.catching_the_transmission()]
+
+
+def clear_all():
+    OdnomastkaDurak.clear_moves_tree()
+    OdnomastkaDurakWithWeights.clear_moves_tree()
+
+
+class InterruptedDurak(OdnomastkaDurak):
+    """
+    Игра, решение которой прерывается после fail_after ходов первого игрока
+    """
+    fail_after = None
+
+    def build_moves_tree_opponent(self):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise KeyboardInterrupt
+            self.fail_after -= 1
+        super().build_moves_tree_opponent()
+
+
+class SharedTableTest(unittest.TestCase):
+    def setUp(self):
+        clear_all()
+
+    def test_unit_weights_match_weighted_solve(self):
+        # одинаковые веса решаются через таблицу без весов, ответы должны совпадать с решением с весами
+        for n in range(1, 8):
+            for cards in itertools.product([0, 1], repeat=n):
+                for player in (0, 1):
+                    for weight in (1, 3):
+                        game = OdnomastkaDurakWithWeights(list(cards), player, [weight] * n)
+                        self.assertIsNotNone(game.core)
+                        expected = answers(game)
+                        game.core = None  # решаем ту же игру с весами
+                        self.assertEqual(answers(game), expected)
+
+    def test_float_weights_are_solved_with_weights(self):
+        game = OdnomastkaDurakWithWeights([1] * 8, 0, [0.1] * 8)
+        self.assertIsNone(game.core)
+        self.assertEqual(game.winning_score(), sum([0.1] * 8))
+
+    def test_concurrent_solves(self):
+        rnd = random.Random(26)
+        deals = [([rnd.randint(0, 1) for _ in range(9)], rnd.randint(0, 1)) for _ in range(16)]
+        expected = [answers(OdnomastkaDurak(cards, player)) for cards, player in deals]
+        clear_all()
+        results = [None] * len(deals)
+
+        def solve(i):
+            results[i] = answers(OdnomastkaDurak(*deals[i]))
+
+        threads = [threading.Thread(target=solve, args=(i,)) for i in range(len(deals))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, expected)
+
+    def test_d_durak_shares_table(self):
+        OdnomastkaDurak([0, 1], 0)
+        size = len(OdnomastkaDurak.moves_tree)
+        game = OdnomastkaD_Durak([0, 1], 0)
+        self.assertEqual(len(OdnomastkaDurak.moves_tree), size)
+        self.assertEqual(game.who_wins(), 2)
+
+    def test_clear_moves_tree(self):
+        game = OdnomastkaDurak([0, 1, 1, 0, 1], 1)
+        expected = answers(game)
+        OdnomastkaDurak.clear_moves_tree()
+        self.assertEqual(len(OdnomastkaDurak.moves_tree), 0)
+        self.assertEqual(answers(game), expected)  # позиция досчитывается заново
+
+    def test_table_is_bounded(self):
+        max_size = OdnomastkaDurak.max_moves_tree_size
+        OdnomastkaDurak.max_moves_tree_size = 10
+        try:
+            OdnomastkaDurak([0, 1, 0, 1, 0, 1], 0)
+            game = OdnomastkaDurak([1, 0, 1], 0)
+            self.assertLess(len(OdnomastkaDurak.moves_tree), 10)
+            self.assertEqual(answers(game), answers(OdnomastkaDurak([1, 0, 1], 0)))
+        finally:
+            OdnomastkaDurak.max_moves_tree_size = max_size
+
+    def test_interrupted_solve_does_not_poison_table(self):
+        cards = [0, 1, 0, 0, 1, 1, 0, 1]
+        expected = answers(OdnomastkaDurak(cards, 1))
+        for fail_after in range(0, 40, 3):
+            game = InterruptedDurak(cards, 1)
+            state = (game.cards, game.size, game.reverse, game.pole)
+            clear_all()
+            game.fail_after = fail_after
+            with self.assertRaises(KeyboardInterrupt):
+                game.who_wins()
+            self.assertEqual((game.cards, game.size, game.reverse, game.pole), state)
+            self.assertTrue(all(p.who_wins != -1 for p in OdnomastkaDurak.moves_tree.values()))
+            game.fail_after = None
+            self.assertEqual(answers(game), expected)
+            self.assertEqual(answers(OdnomastkaD_Durak(cards, 1))[1:], expected[1:])
+
+
+class EditTest(unittest.TestCase):
+    def setUp(self):
+        clear_all()
+
+    def fresh_answers(self, game):
+        """
+        :return: ответы новой игры с той же раздачей, решенной с пустыми таблицами
+        """
+        cards = [(game.cards >> i) % 2 ^ game.reverse for i in range(game.size)]
+        clear_all()
+        if isinstance(game, OdnomastkaDurakWithWeights):
+            return answers(type(game)(cards, game.reverse, game.weights))
+        return answers(type(game)(cards, game.reverse))
+
+    def test_edits_match_fresh_solve(self):
+        rnd = random.Random(2021)
+        classes = [OdnomastkaDurak, OdnomastkaD_Durak, OdnomastkaDurakWithWeights, OdnomastkaD_DurakWithWeights]
+        for _ in range(300):
+            n = rnd.randint(1, 8)
+            cards = [rnd.randint(0, 1) for _ in range(n)]
+            cls = rnd.choice(classes)
+            weighted = issubclass(cls, OdnomastkaDurakWithWeights)
+            if weighted:
+                weights = [1] * n if rnd.random() < 0.3 else [rnd.randint(-3, 4) for _ in range(n)]
+                game = cls(cards, rnd.randint(0, 1), weights)
+            else:
+                game = cls(cards, rnd.randint(0, 1))
+            for _ in range(5):
+                if rnd.random() < 0.3 and not game.is_end():  # правка посреди игры
+                    game.move_by_computer()
+                    if game.pole != -1 and not game.is_end():
+                        game.move_by_computer()
+                if game.pole != -1 or not game.names_of_cards:
+                    break
+                card = rnd.choice(game.names_of_cards)
+                pos = game.names_of_cards.index(card)
+                if weighted and rnd.random() < 0.5:
+                    weight = rnd.choice([-2, 0, 1, 1, 3])
+                    self.assertEqual(game.set_weight(card, weight), 0)
+                    self.assertEqual(game.weights[pos], weight)
+                else:
+                    player = rnd.randint(0, 1)
+                    self.assertEqual(game.set_owner(card, player), 0)
+                    self.assertEqual((game.cards >> pos) % 2 ^ game.reverse, player)
+                self.assertEqual(answers(game), self.fresh_answers(game))
+
+    def test_invalid_edits(self):
+        game = OdnomastkaDurakWithWeights([0, 1, 0], 0, [1, 2, 3])
+        self.assertEqual(game.set_owner(4, 0), -1)
+        self.assertEqual(game.set_owner(1, 2), -1)
+        self.assertEqual(game.set_weight(0, 5), -1)
+        game.move_by_computer()  # на столе карта
+        self.assertEqual(game.set_owner(1, 1), -1)
+        self.assertEqual(game.set_weight(1, 5), -1)
+
+    def test_weight_edits_remove_superseded_positions(self):
+        cards = [0, 1, 0, 1, 1, 0, 0, 1]
+        game = OdnomastkaDurakWithWeights(cards, 0, [1, 2, 3, 4, 5, 6, 7, 8])
+        solve_size = len(OdnomastkaDurakWithWeights.moves_tree)
+        for weight in range(10):
+            game.set_weight(weight % 8 + 1, weight + 10)
+            # ходы от весов не зависят, поэтому в таблице ровно позиции новой раздачи
+            self.assertEqual(len(OdnomastkaDurakWithWeights.moves_tree), solve_size)
+        expected = answers(game)
+        self.assertEqual(expected, self.fresh_answers(game))
+        self.assertEqual(len(OdnomastkaDurakWithWeights.moves_tree), solve_size)
+
+
+if __name__ == '__main__':
+    unittest.main()